@@ -6,12 +6,35 @@ Created by Chaitanya Eshwar Prasad
 """
 
 import os
+import re
 import sqlite3
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify
+import hashlib
+import base64
+import mimetypes
+import struct
+import threading
+import multiprocessing
+import time
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+import click
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify, Response, stream_with_context, send_from_directory, abort
+from werkzeug.datastructures import MultiDict
 from werkzeug.utils import secure_filename
+from werkzeug.http import parse_accept_header
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import json
+import zipfile
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    # Optional: responses fall back to gzip
+    brotli = None
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -19,6 +42,40 @@ app.config['SECRET_KEY'] = 'pci-dss-audit-secret-key-change-in-production'
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Evidence store maintenance
+app.config['EVIDENCE_SCAN_INTERVAL'] = 24 * 60 * 60  # Seconds between background scans, 0 disables
+app.config['EVIDENCE_SCAN_WORKERS'] = None  # Hashing processes, None uses one per CPU
+app.config['EVIDENCE_ORPHAN_GRACE'] = 60 * 60  # Never reclaim orphans younger than this (in-flight uploads)
+
+# Delta sync
+app.config['SYNC_PAGE_SIZE'] = 500  # Max change_log entries per /api/sync/changes response
+app.config['SYNC_LOG_RETENTION_DAYS'] = 30  # Older entries are pruned; clients behind that get a full resync
+
+# Response compression and payload budgets
+app.config['COMPRESSION_LEVEL'] = 6  # gzip 1-9 / brotli 0-11
+app.config['COMPRESSION_MIN_SIZE'] = 500  # Bytes; smaller buffered responses are sent as-is
+app.config['PAYLOAD_BUDGET_DEFAULT'] = 256 * 1024  # Uncompressed HTML bytes before a warning is logged
+app.config['PAYLOAD_BUDGETS'] = {  # Per-endpoint overrides, None disables the check
+    'generate_report': 1024 * 1024,
+}
+
+# Database backups
+app.config['BACKUP_FOLDER'] = 'backups'
+app.config['BACKUP_INTERVAL'] = 6 * 60 * 60  # Seconds between scheduled backups, 0 disables
+app.config['BACKUP_RETENTION'] = 28  # Scheduled snapshots to keep
+app.config['BACKUP_PRE_RESTORE_RETENTION'] = 5  # Safety copies taken by restore-db to keep
+app.config['BACKUP_PAGES_PER_STEP'] = 256  # Database pages copied per backup step
+app.config['BACKUP_STEP_PAUSE'] = 0.01  # Seconds to yield to writers between steps
+app.config['BACKUP_INCLUDE_EVIDENCE'] = True  # Write an evidence hash manifest next to each snapshot
+
+# Evidence encryption at rest
+app.config['EVIDENCE_ENCRYPTION'] = True  # Encrypt new uploads with AES-256-GCM
+app.config['EVIDENCE_KEY_FILE'] = 'database/evidence.key'  # Master key, used when ACEP_EVIDENCE_KEY is not set
+
+# Service provider assessment schedule
+app.config['SP_DUE_WEEKS'] = 8  # Default look-ahead of /api/service-providers/due
+app.config['SP_EXPIRY_CHECK_INTERVAL'] = 60 * 60  # Seconds between lapsed-assessment checks, 0 disables
+
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('database', exist_ok=True)
@@ -26,6 +83,23 @@ os.makedirs('database', exist_ok=True)
 # Database configuration
 DATABASE = 'database/pci_dss_audit.db'
 
+# Read/write block size for evidence files
+EVIDENCE_CHUNK_SIZE = 1024 * 1024
+
+# Seconds between SSE keepalive comments on idle dashboard streams
+DASHBOARD_KEEPALIVE = 15
+
+# Entity tables whose writes are counted in data_versions
+VERSIONED_TABLES = ('pci_requirements', 'evidence', 'risks', 'cardholder_data_tracking', 'service_providers')
+
+# Tables edited with compare-and-swap on row_version, mapped to the key column their edit routes use
+ROW_VERSIONED_TABLES = {
+    'pci_requirements': 'requirement_id',
+    'risks': 'id',
+    'cardholder_data_tracking': 'id',
+    'service_providers': 'id',
+}
+
 # Template helper functions
 def get_file_icon(filename):
     """Get Bootstrap icon class based on file extension"""
@@ -78,6 +152,12 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+def get_data_version(conn, *tables):
+    """Current write counters for the given tables, usable as a cache key"""
+    placeholders = ','.join('?' * len(tables))
+    rows = conn.execute(f'SELECT table_name, version FROM data_versions WHERE table_name IN ({placeholders})', tables).fetchall()
+    return tuple(sorted((row['table_name'], row['version']) for row in rows))
+
 def init_database():
     """Initialize database with required tables"""
     conn = get_db_connection()
@@ -133,7 +213,34 @@ def init_database():
     except sqlite3.OperationalError:
         # Column already exists
         pass
-    
+
+    # SHA-256 of the stored file, recorded at upload time (backfilled by the integrity scanner)
+    try:
+        conn.execute('ALTER TABLE evidence ADD COLUMN file_hash TEXT')
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+
+    # Stored file is sealed with a per-file data key (see EvidenceEncryptor)
+    try:
+        conn.execute('ALTER TABLE evidence ADD COLUMN encrypted INTEGER DEFAULT 0')
+        conn.commit()
+    except sqlite3.OperationalError:
+        # Column already exists
+        pass
+
+    # Integrity scanner checkpoints so incremental scans can skip unchanged files
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS evidence_scan_state (
+            file_path TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            sha256 TEXT NOT NULL,
+            scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
     # Risk register table
     conn.execute('''
         CREATE TABLE IF NOT EXISTS risks (
@@ -184,7 +291,60 @@ def init_database():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_evidence_requirement_id ON evidence (requirement_id)')
+
+    # Optimistic concurrency: every edit bumps row_version and must name the version it started from
+    for table in ROW_VERSIONED_TABLES:
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1')
+            conn.commit()
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
+
+    # Assessment dates are stored as ISO text so the due/overdue range queries can use the index
+    normalize_service_provider_dates(conn)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_service_providers_next_assessment ON service_providers (next_assessment_date)')
+
+    # Per-table write counters, bumped by triggers so caches can be keyed on them
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        conn.execute('INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)', (table,))
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{operation.lower()}_version
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                END
+            ''')
+
+    # Monotonic change sequence for the delta-sync API, one entry per written row
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        for operation, row, kind in (('INSERT', 'NEW', 'upsert'), ('UPDATE', 'NEW', 'upsert'), ('DELETE', 'OLD', 'delete')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{operation.lower()}_changelog
+                AFTER {operation} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation) VALUES ('{table}', {row}.id, '{kind}');
+                END
+            ''')
+
     conn.commit()
     
     # Create default admin user if not exists
@@ -285,6 +445,615 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Evidence coverage
+COVERAGE_QUERY = '''
+    SELECT r.requirement_id, r.title, r.category, r.status,
+           COUNT(e.id) AS evidence_count,
+           MAX(e.uploaded_at) AS latest_upload,
+           COALESCE(SUM(e.file_size), 0) AS total_bytes
+    FROM pci_requirements r
+    LEFT JOIN evidence e ON e.requirement_id = r.requirement_id
+    GROUP BY r.id
+    ORDER BY r.category, r.requirement_id
+'''
+
+_coverage_cache = {'version': None, 'coverage': None}
+_coverage_lock = threading.Lock()
+
+def get_evidence_coverage(conn):
+    """Per-requirement evidence counts, latest upload and total bytes.
+
+    Computed with a single grouped query and cached until pci_requirements or
+    evidence is written. The returned dict is shared, treat it as read-only.
+    """
+    version = get_data_version(conn, 'pci_requirements', 'evidence')
+    with _coverage_lock:
+        if _coverage_cache['version'] == version:
+            return _coverage_cache['coverage']
+
+    requirements = []
+    for row in conn.execute(COVERAGE_QUERY).fetchall():
+        item = dict(row)
+        item['missing_evidence'] = item['evidence_count'] == 0
+        # Marked compliant without anything to show a QSA
+        item['unsupported'] = item['missing_evidence'] and item['status'] == 'Compliant'
+        requirements.append(item)
+
+    total = len(requirements)
+    covered = sum(1 for item in requirements if not item['missing_evidence'])
+    coverage = {
+        'requirements': requirements,
+        'summary': {
+            'total_requirements': total,
+            'covered_requirements': covered,
+            'missing_requirements': total - covered,
+            'unsupported_requirements': sum(1 for item in requirements if item['unsupported']),
+            'coverage_percentage': round(covered / total * 100 if total > 0 else 0, 1),
+            'evidence_count': sum(item['evidence_count'] for item in requirements),
+            'total_bytes': sum(item['total_bytes'] for item in requirements),
+        },
+    }
+
+    with _coverage_lock:
+        _coverage_cache['version'] = version
+        _coverage_cache['coverage'] = coverage
+    return coverage
+
+# Live dashboard
+DASHBOARD_COUNTERS_QUERY = '''
+    SELECT r.*, k.*, c.*, s.*
+    FROM (SELECT COUNT(*) AS total_requirements,
+                 COALESCE(SUM(status = 'Compliant'), 0) AS compliant_requirements,
+                 COALESCE(SUM(status = 'Not Compliant'), 0) AS non_compliant_requirements,
+                 COALESCE(SUM(status = 'Not Applicable'), 0) AS not_applicable_requirements,
+                 COALESCE(SUM(status = 'Not Assessed'), 0) AS not_assessed_requirements
+          FROM pci_requirements) r,
+         (SELECT COUNT(*) AS total_risks,
+                 COALESCE(SUM(risk_score >= 15), 0) AS high_risks,
+                 COALESCE(SUM(risk_score >= 8 AND risk_score < 15), 0) AS medium_risks,
+                 COALESCE(SUM(risk_score < 8), 0) AS low_risks
+          FROM risks) k,
+         (SELECT COUNT(*) AS total_cardholder_data_types FROM cardholder_data_tracking) c,
+         (SELECT COUNT(*) AS total_service_providers,
+                 COALESCE(SUM(contract_status = 'Active'), 0) AS active_service_providers
+          FROM service_providers) s
+'''
+
+def get_dashboard_snapshot(conn):
+    """All dashboard counters and recent activity, computed in two queries"""
+    snapshot = dict(conn.execute(DASHBOARD_COUNTERS_QUERY).fetchone())
+
+    # Calculate compliance percentage
+    assessed_requirements = snapshot['total_requirements'] - snapshot['not_assessed_requirements']
+    snapshot['compliance_percentage'] = round((snapshot['compliant_requirements'] / assessed_requirements * 100) if assessed_requirements > 0 else 0, 1)
+
+    snapshot['recent_requirements'] = [dict(row) for row in conn.execute('''
+        SELECT requirement_id, title, status, assessed_by, assessed_at
+        FROM pci_requirements
+        WHERE assessed_at IS NOT NULL
+        ORDER BY assessed_at DESC
+        LIMIT 5
+    ''').fetchall()]
+    return snapshot
+
+class _DashboardSubscriber:
+    """Pending update for one connected dashboard; newer deltas overwrite older ones"""
+
+    def __init__(self):
+        self.pending = {}
+        self.ready = threading.Event()
+
+class DashboardBroadcaster:
+    """In-process fan-out of dashboard deltas to every open SSE stream.
+
+    The snapshot is recomputed once per data change, however many
+    dashboards are connected, and after a full snapshot on connect each
+    client only receives the counters that changed since the previous broadcast.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._subscribers = set()
+        self._version = None
+        self._snapshot = None
+
+    def subscribe(self):
+        """Register a stream, starting it with the full current snapshot.
+
+        A new or reconnecting dashboard may have missed deltas since its page
+        was rendered, so it gets every counter once before the deltas.
+        """
+        subscriber = _DashboardSubscriber()
+        with self._publish_lock:
+            snapshot = self._publish()
+            with self._lock:
+                subscriber.pending = dict(snapshot)
+                subscriber.ready.set()
+                self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                # Nobody is tracking changes now, so the next broadcast must be a full snapshot
+                self._version = None
+                self._snapshot = None
+
+    def take(self, subscriber):
+        """Return and clear the subscriber's pending delta"""
+        with self._lock:
+            delta, subscriber.pending = subscriber.pending, {}
+            subscriber.ready.clear()
+        return delta
+
+    def publish_if_changed(self):
+        """Broadcast counters that changed since the last publish"""
+        if not self._subscribers:
+            return
+
+        with self._publish_lock:
+            self._publish()
+
+    def _publish(self):
+        """Recompute the snapshot if the data changed and queue the delta; returns the snapshot.
+
+        Callers hold _publish_lock, so a slow publish can't store an older
+        snapshot over a newer one.
+        """
+        conn = get_db_connection()
+        try:
+            version = get_data_version(conn, *VERSIONED_TABLES)
+            with self._lock:
+                if version == self._version:
+                    return self._snapshot
+            snapshot = get_dashboard_snapshot(conn)
+        finally:
+            conn.close()
+
+        with self._lock:
+            previous = self._snapshot or {}
+            delta = {key: value for key, value in snapshot.items() if previous.get(key) != value}
+            self._version = version
+            self._snapshot = snapshot
+            if delta:
+                for subscriber in self._subscribers:
+                    subscriber.pending.update(delta)
+                    subscriber.ready.set()
+        return snapshot
+
+dashboard_broadcaster = DashboardBroadcaster()
+
+@app.after_request
+def publish_dashboard_changes(response):
+    """Push dashboard deltas once a write request has been answered"""
+    if request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        response.call_on_close(dashboard_broadcaster.publish_if_changed)
+    return response
+
+# Response compression and payload budgets
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+def _negotiate_encoding(accept_encoding):
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, or None"""
+    accept = parse_accept_header(accept_encoding)
+    gzip_quality = accept.quality('gzip')
+    if brotli is not None and accept.quality('br') > 0 and accept.quality('br') >= gzip_quality:
+        return 'br'
+    if gzip_quality > 0:
+        return 'gzip'
+    return None
+
+class _StreamCompressor:
+    """Incremental gzip/brotli compressor with a common interface"""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data, flush=False):
+        if self.encoding == 'br':
+            out = self._compressor.process(data)
+            return out + self._compressor.flush() if flush else out
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class PayloadMetrics:
+    """Per-endpoint response size counters with configurable HTML budgets"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, content_type, raw_bytes, sent_bytes):
+        budget = None
+        if content_type.startswith('text/html'):
+            budget = app.config['PAYLOAD_BUDGETS'].get(endpoint, app.config['PAYLOAD_BUDGET_DEFAULT'])
+        over_budget = budget is not None and raw_bytes > budget
+
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0, 'raw_bytes': 0, 'sent_bytes': 0, 'max_raw_bytes': 0, 'over_budget': 0,
+            })
+            stats['requests'] += 1
+            stats['raw_bytes'] += raw_bytes
+            stats['sent_bytes'] += sent_bytes
+            stats['max_raw_bytes'] = max(stats['max_raw_bytes'], raw_bytes)
+            stats['budget'] = budget
+            if over_budget:
+                stats['over_budget'] += 1
+
+        if over_budget:
+            app.logger.warning('Payload budget exceeded on %s: %s (budget %s, sent %s)',
+                               endpoint, format_file_size(raw_bytes), format_file_size(budget),
+                               format_file_size(sent_bytes))
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
+
+payload_metrics = PayloadMetrics()
+
+class CompressionMiddleware:
+    """WSGI middleware that gzip/brotli-compresses responses as they stream.
+
+    Buffered responses are compressed in one go; streamed responses (no
+    Content-Length) are flushed after every chunk so the client sees data as
+    soon as the application yields it. Raw and transferred sizes of every
+    response are recorded in payload_metrics.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        encoding = _negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        state = {'compressor': None, 'streamed': False, 'content_type': ''}
+
+        def _start_response(status, headers, exc_info=None):
+            header_map = {name.lower(): value for name, value in headers}
+            state['content_type'] = header_map.get('content-type', '')
+            content_length = header_map.get('content-length')
+            state['streamed'] = content_length is None
+            status_code = int(status.split(' ', 1)[0])
+
+            if (encoding
+                    and environ.get('REQUEST_METHOD') != 'HEAD'
+                    and status_code not in (204, 206, 304)
+                    and 'content-encoding' not in header_map
+                    and 'no-transform' not in header_map.get('cache-control', '')
+                    and state['content_type'].startswith(COMPRESSIBLE_TYPES)
+                    and (content_length is None or int(content_length) >= app.config['COMPRESSION_MIN_SIZE'])):
+                state['compressor'] = _StreamCompressor(encoding, app.config['COMPRESSION_LEVEL'])
+                headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+                headers.append(('Content-Encoding', encoding))
+                vary = header_map.get('vary')
+                headers = [(name, value) for name, value in headers if name.lower() != 'vary']
+                headers.append(('Vary', f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'))
+
+            etag = header_map.get('etag')
+            if etag and not etag.startswith('W/') and (state['compressor'] is not None or (encoding and status_code == 304)):
+                # The compressed bytes differ from the identity ones, so the tag can only
+                # be weak; If-None-Match uses weak comparison and still revalidates
+                headers = [(name, f'W/{value}' if name.lower() == 'etag' else value) for name, value in headers]
+
+            return start_response(status, headers, exc_info)
+
+        app_iter = self.wsgi_app(environ, _start_response)
+        return self._iter_body(environ, app_iter, state)
+
+    def _iter_body(self, environ, app_iter, state):
+        raw_bytes = 0
+        sent_bytes = 0
+        try:
+            for chunk in app_iter:
+                raw_bytes += len(chunk)
+                compressor = state['compressor']
+                if compressor is not None:
+                    chunk = compressor.compress(chunk, flush=state['streamed'])
+                if chunk:
+                    sent_bytes += len(chunk)
+                    yield chunk
+
+            if state['compressor'] is not None:
+                tail = state['compressor'].finish()
+                sent_bytes += len(tail)
+                yield tail
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            payload_metrics.record(environ.get('acep.endpoint') or '<unmatched>',
+                                   state['content_type'], raw_bytes, sent_bytes)
+
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+
+@app.before_request
+def tag_request_endpoint():
+    """Expose the endpoint name to CompressionMiddleware for payload metrics"""
+    request.environ['acep.endpoint'] = request.endpoint
+
+# Optimistic concurrency
+# Max keys per IN (...) lookup, well under SQLite's bound parameter limit
+VERSION_CHECK_BATCH = 500
+
+def request_data(*required):
+    """Submitted fields from either a form post or a JSON object, aborting with 400 if any required one is missing"""
+    if request.is_json:
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            abort(400, 'Request body must be a JSON object')
+        data = MultiDict(payload)
+    else:
+        data = request.form
+
+    missing = [field for field in required if field not in data]
+    if missing:
+        abort(400, f"Missing field(s): {', '.join(missing)}")
+    return data
+
+def submitted_row_version(data):
+    """The row_version the client edited.
+
+    API clients must send one (428 otherwise). Forms without it, from pages
+    rendered before row_version existed, still overwrite unconditionally.
+    """
+    value = data.get('row_version')
+    if value is None or value == '':
+        if wants_json():
+            abort(428, 'row_version is required, fetch the record and resubmit with its row_version')
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        abort(400, 'row_version must be an integer')
+
+def compare_and_swap(conn, table, key, expected_version, assignments, params):
+    """UPDATE a row only if it is still at the row_version the client edited.
+
+    ``assignments`` is the SET clause; row_version is bumped alongside it.
+    Returns (updated, current row), where the row is None if it does not
+    exist. Without an expected version the update is applied unconditionally.
+    """
+    key_column = ROW_VERSIONED_TABLES[table]
+    query = f'UPDATE {table} SET {assignments}, row_version = row_version + 1 WHERE {key_column} = ?'
+    args = list(params) + [key]
+    if expected_version is not None:
+        query += ' AND row_version = ?'
+        args.append(expected_version)
+
+    try:
+        updated = conn.execute(query, args).rowcount > 0
+    except sqlite3.Error:
+        # Don't leave the write transaction open, it would lock out other writers
+        conn.rollback()
+        raise
+    if updated:
+        conn.commit()
+    current = conn.execute(f'SELECT * FROM {table} WHERE {key_column} = ?', (key,)).fetchone()
+    return updated, current
+
+def wants_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+@app.errorhandler(400)
+@app.errorhandler(428)
+def json_client_error(error):
+    """Give API clients the error as JSON instead of an HTML page"""
+    if wants_json():
+        return jsonify({'error': error.description}), error.code
+    return error
+
+def row_update_response(updated, current, label, endpoint):
+    """Answer a compare-and-swap edit with a redirect for forms or JSON for API clients.
+
+    On conflict JSON clients get 409 with the current row to merge against and
+    resubmit with its row_version.
+    """
+    if wants_json():
+        if current is None:
+            return jsonify({'error': f'{label} not found'}), 404
+        if not updated:
+            return jsonify({'error': 'conflict', 'current': dict(current)}), 409
+        return jsonify({'success': True, 'current': dict(current)})
+
+    if current is None:
+        flash(f'{label} not found!', 'error')
+    elif not updated:
+        flash(f'{label} was changed by someone else while you were editing. '
+              'Your changes were not saved, please review the latest version and try again.', 'warning')
+    else:
+        flash(f'{label} updated successfully!', 'success')
+    return redirect(url_for(endpoint))
+
+def find_version_conflicts(conn, rows):
+    """Compare client-held row versions with the database in one query per table.
+
+    ``rows`` is a list of {'table', 'id', 'row_version'}; returns those that
+    are stale or deleted, each with the current row (None if deleted).
+    """
+    by_table = {}
+    for row in rows:
+        by_table.setdefault(row['table'], []).append(row)
+
+    conflicts = []
+    for table, items in by_table.items():
+        key_column = ROW_VERSIONED_TABLES[table]
+        keys = list({item['id'] for item in items})
+        current = {}
+        for start in range(0, len(keys), VERSION_CHECK_BATCH):
+            batch = keys[start:start + VERSION_CHECK_BATCH]
+            query = f"SELECT * FROM {table} WHERE {key_column} IN ({','.join('?' * len(batch))})"
+            for found in conn.execute(query, batch).fetchall():
+                current[found[key_column]] = found
+
+        for item in items:
+            found = current.get(item['id'])
+            if found is None or found['row_version'] != item['row_version']:
+                conflicts.append(dict(item, current=dict(found) if found else None))
+    return conflicts
+
+# Service provider assessment schedule
+ISO_DATE_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+
+# Only for migrating dates stored before input was validated; day-first is tried
+# before month-first, so ambiguous dates are a guess and new input must be ISO
+DATE_INPUT_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%d.%m.%Y',
+                      '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y')
+
+# What a Compliant provider becomes once its next assessment date has passed
+LAPSED_AOC_STATUS = 'Non-Compliant'
+
+def normalize_date(value):
+    """Return a date as 'YYYY-MM-DD', or None if blank. Raises ValueError if it is not a date."""
+    if value is None or not str(value).strip():
+        return None
+    value = str(value).strip()
+    # SQLite timestamps ('YYYY-MM-DD HH:MM:SS') keep just the date part
+    if re.match(r'^\d{4}-\d{2}-\d{2}[ T]', value):
+        value = value[:10]
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f'Unrecognised date: {value}')
+
+def parse_iso_date(value):
+    """Return a submitted 'YYYY-MM-DD' date, or None if blank. Raises ValueError for anything else."""
+    if value is None or not str(value).strip():
+        return None
+    value = str(value).strip()
+    if re.match(r'^\d{4}-\d{2}-\d{2}$', value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            pass  # Well-formed but not a real date, e.g. 2026-02-30
+    raise ValueError(f'Dates must be given as YYYY-MM-DD: {value}')
+
+def normalize_service_provider_dates(conn):
+    """Rewrite assessment dates stored in other formats as ISO dates so they sort and index correctly"""
+    rows = conn.execute(f'''
+        SELECT id, last_assessment_date, next_assessment_date FROM service_providers
+        WHERE last_assessment_date NOT GLOB '{ISO_DATE_GLOB}' OR next_assessment_date NOT GLOB '{ISO_DATE_GLOB}'
+    ''').fetchall()
+
+    for row in rows:
+        dates = []
+        for column in ('last_assessment_date', 'next_assessment_date'):
+            try:
+                dates.append(normalize_date(row[column]))
+            except ValueError:
+                # Leave it for a person to fix rather than lose it; it is ignored by the schedule
+                app.logger.warning('Service provider #%s has an unrecognised %s: %r', row['id'], column, row[column])
+                dates.append(row[column])
+        if dates == [row['last_assessment_date'], row['next_assessment_date']]:
+            continue
+        conn.execute('''
+            UPDATE service_providers
+            SET last_assessment_date = ?, next_assessment_date = ?, row_version = row_version + 1
+            WHERE id = ?
+        ''', (*dates, row['id']))
+    conn.commit()
+
+def get_assessment_schedule(conn, weeks, today=None):
+    """Overdue providers, and those due in each of the next ``weeks`` weeks (starting Monday).
+
+    Only rows inside the window are read, through the next_assessment_date
+    index. Providers with terminated contracts are left out.
+    """
+    today = today or date.today()
+    week_start = today - timedelta(days=today.weekday())
+    horizon = week_start + timedelta(weeks=weeks)
+
+    rows = conn.execute(f'''
+        SELECT id, name, contract_status, compliance_status, pci_level, last_assessment_date, next_assessment_date
+        FROM service_providers
+        WHERE next_assessment_date < ? AND next_assessment_date GLOB '{ISO_DATE_GLOB}'
+          AND COALESCE(contract_status, '') != 'Terminated'
+        ORDER BY next_assessment_date
+    ''', (horizon.isoformat(),)).fetchall()
+
+    overdue = []
+    buckets = [{'week_start': (week_start + timedelta(weeks=i)).isoformat(), 'providers': []} for i in range(weeks)]
+    for row in rows:
+        due = datetime.strptime(row['next_assessment_date'], '%Y-%m-%d').date()
+        provider = dict(row, days_until_due=(due - today).days)
+        if due < today:
+            overdue.append(provider)
+        else:
+            buckets[(due - week_start).days // 7]['providers'].append(provider)
+
+    for bucket in buckets:
+        bucket['count'] = len(bucket['providers'])
+    return {'today': today.isoformat(), 'overdue': overdue, 'overdue_count': len(overdue), 'weeks': buckets}
+
+class AssessmentExpiryQueue:
+    """Min-heap of (next_assessment_date, provider id) for every Compliant provider.
+
+    The heap is rebuilt only when service_providers has changed, so a check
+    just pops the entries that have lapsed instead of scanning all providers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._version = None
+
+    def _refresh(self, conn):
+        version = get_data_version(conn, 'service_providers')
+        if version == self._version:
+            return
+        rows = conn.execute(f'''
+            SELECT id, next_assessment_date FROM service_providers
+            WHERE compliance_status = 'Compliant' AND next_assessment_date GLOB '{ISO_DATE_GLOB}'
+        ''').fetchall()
+        self._heap = [(row['next_assessment_date'], row['id']) for row in rows]
+        heapq.heapify(self._heap)
+        self._version = version
+
+    def expire_lapsed(self, today=None):
+        """Mark Compliant providers whose assessment date has passed; returns their ids"""
+        today = (today or date.today()).isoformat()
+        expired = []
+
+        conn = get_db_connection()
+        try:
+            with self._lock:
+                self._refresh(conn)
+                lapsed = []
+                while self._heap and self._heap[0][0] < today:
+                    lapsed.append(heapq.heappop(self._heap)[1])
+
+                for sp_id in lapsed:
+                    # Re-checked in the UPDATE in case the provider was reassessed since the heap was built
+                    cursor = conn.execute('''
+                        UPDATE service_providers
+                        SET compliance_status = ?, updated_at = CURRENT_TIMESTAMP, row_version = row_version + 1
+                        WHERE id = ? AND compliance_status = 'Compliant' AND next_assessment_date < ?
+                    ''', (LAPSED_AOC_STATUS, sp_id, today))
+                    if cursor.rowcount:
+                        expired.append(sp_id)
+                conn.commit()
+        finally:
+            conn.close()
+
+        if expired:
+            app.logger.info('Assessment lapsed for %d service provider(s): %s', len(expired), expired)
+            dashboard_broadcaster.publish_if_changed()
+        return expired
+
+assessment_expiry_queue = AssessmentExpiryQueue()
+
 # Routes (shortened version for testing)
 @app.route('/')
 def index():
@@ -326,63 +1095,39 @@ def logout():
 def dashboard():
     """Main dashboard with PCI DSS compliance overview"""
     conn = get_db_connection()
-    
-    # Get requirement statistics
-    total_requirements = conn.execute('SELECT COUNT(*) as count FROM pci_requirements').fetchone()['count']
-    compliant_requirements = conn.execute("SELECT COUNT(*) as count FROM pci_requirements WHERE status = 'Compliant'").fetchone()['count']
-    non_compliant_requirements = conn.execute("SELECT COUNT(*) as count FROM pci_requirements WHERE status = 'Not Compliant'").fetchone()['count']
-    not_applicable_requirements = conn.execute("SELECT COUNT(*) as count FROM pci_requirements WHERE status = 'Not Applicable'").fetchone()['count']
-    not_assessed_requirements = conn.execute("SELECT COUNT(*) as count FROM pci_requirements WHERE status = 'Not Assessed'").fetchone()['count']
-    
-    # Get risk statistics
-    total_risks = conn.execute('SELECT COUNT(*) as count FROM risks').fetchone()['count']
-    high_risks = conn.execute('SELECT COUNT(*) as count FROM risks WHERE risk_score >= 15').fetchone()['count']
-    medium_risks = conn.execute('SELECT COUNT(*) as count FROM risks WHERE risk_score >= 8 AND risk_score < 15').fetchone()['count']
-    low_risks = conn.execute('SELECT COUNT(*) as count FROM risks WHERE risk_score < 8').fetchone()['count']
-    
-    # Get Cardholder Data Tracking statistics
-    total_cardholder_data_types = conn.execute('SELECT COUNT(*) as count FROM cardholder_data_tracking').fetchone()['count']
-    
-    # Get Service Provider statistics
-    total_service_providers = conn.execute('SELECT COUNT(*) as count FROM service_providers').fetchone()['count']
-    active_service_providers = conn.execute("SELECT COUNT(*) as count FROM service_providers WHERE contract_status = 'Active'").fetchone()['count']
-    
-    # Get recent activity
-    recent_requirements = conn.execute('''
-        SELECT requirement_id, title, status, assessed_at 
-        FROM pci_requirements 
-        WHERE assessed_at IS NOT NULL 
-        ORDER BY assessed_at DESC 
-        LIMIT 5
-    ''').fetchall()
-    
-    # Calculate compliance percentage
-    assessed_requirements = total_requirements - not_assessed_requirements
-    compliance_percentage = round((compliant_requirements / assessed_requirements * 100) if assessed_requirements > 0 else 0, 1)
+    snapshot = get_dashboard_snapshot(conn)
+    conn.close()
     
     # Get current date and time
     current_date = datetime.now().strftime('%d %B %Y')
     current_time = datetime.now().strftime('%H:%M')
     
-    conn.close()
-    
     return render_template('dashboard.html',
-                         total_requirements=total_requirements,
-                         compliant_requirements=compliant_requirements,
-                         non_compliant_requirements=non_compliant_requirements,
-                         not_applicable_requirements=not_applicable_requirements,
-                         not_assessed_requirements=not_assessed_requirements,
-                         compliance_percentage=compliance_percentage,
-                         total_risks=total_risks,
-                         high_risks=high_risks,
-                         medium_risks=medium_risks,
-                         low_risks=low_risks,
-                         total_cardholder_data_types=total_cardholder_data_types,
-                         total_service_providers=total_service_providers,
-                         active_service_providers=active_service_providers,
-                         recent_requirements=recent_requirements,
                          current_date=current_date,
-                         current_time=current_time)
+                         current_time=current_time,
+                         **snapshot)
+
+@app.route('/dashboard/stream')
+@login_required
+def dashboard_stream():
+    """Server-Sent Events stream of dashboard counter changes"""
+    def generate():
+        subscriber = dashboard_broadcaster.subscribe()
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                if subscriber.ready.wait(timeout=DASHBOARD_KEEPALIVE):
+                    delta = dashboard_broadcaster.take(subscriber)
+                    if delta:
+                        yield f'event: dashboard\ndata: {json.dumps(delta, default=str)}\n\n'
+                else:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+        finally:
+            dashboard_broadcaster.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/audit')
 @login_required
@@ -411,21 +1156,20 @@ def audit_checklist():
 @login_required
 def update_requirement():
     """Update requirement status and notes"""
-    requirement_id = request.form['requirement_id']
-    status = request.form['status']
-    notes = request.form['notes']
+    data = request_data('requirement_id', 'status', 'notes')
+    requirement_id = data['requirement_id']
+    status = data['status']
+    notes = data['notes']
     
     conn = get_db_connection()
-    conn.execute('''
-        UPDATE pci_requirements 
-        SET status = ?, notes = ?, assessed_by = ?, assessed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-        WHERE requirement_id = ?
-    ''', (status, notes, session['username'], requirement_id))
-    conn.commit()
-    conn.close()
+    try:
+        updated, current = compare_and_swap(conn, 'pci_requirements', requirement_id, submitted_row_version(data),
+            'status = ?, notes = ?, assessed_by = ?, assessed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP',
+            (status, notes, session['username']))
+    finally:
+        conn.close()
     
-    flash('Requirement updated successfully!', 'success')
-    return redirect(url_for('audit_checklist'))
+    return row_update_response(updated, current, 'Requirement', 'audit_checklist')
 
 @app.route('/evidence')
 @login_required
@@ -473,18 +1217,55 @@ def upload_evidence():
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         unique_filename = f"{timestamp}_{filename}"
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        file.save(file_path)
-        file_size = os.path.getsize(file_path)
-        
+
+        # Hash the plaintext while writing so the integrity scanner has a baseline without re-reading the file
+        encrypted = app.config['EVIDENCE_ENCRYPTION']
+        try:
+            # Before creating the file, so a bad key can't leave an empty orphan
+            master_key = get_evidence_master_key() if encrypted else None
+        except (OSError, ValueError) as e:
+            app.logger.error('Evidence master key unavailable: %s', e)
+            flash('Error saving evidence: encryption key unavailable', 'error')
+            return redirect(url_for('evidence'))
+
+        sha256 = hashlib.sha256()
+        file_size = 0
+        try:
+            with open(file_path, 'wb') as out:
+                writer = EvidenceEncryptor(out, master_key) if encrypted else out
+                for chunk in iter(lambda: file.stream.read(EVIDENCE_CHUNK_SIZE), b''):
+                    sha256.update(chunk)
+                    file_size += len(chunk)
+                    writer.write(chunk)
+                if encrypted:
+                    writer.finish()
+        except OSError as e:
+            # Disk full or similar: don't leave a partial file behind
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            flash(f'Error saving evidence: {str(e)}', 'error')
+            return redirect(url_for('evidence'))
+        except Exception:
+            # Client disconnected mid-upload
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
         conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO evidence (requirement_id, filename, original_filename, file_path, file_size, description, uploaded_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (requirement_id, unique_filename, filename, file_path, file_size, description, session['username']))
-        conn.commit()
-        conn.close()
-        
+        try:
+            conn.execute('''
+                INSERT INTO evidence (requirement_id, filename, original_filename, file_path, file_size, file_hash, encrypted, description, uploaded_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (requirement_id, unique_filename, filename, file_path, file_size, sha256.hexdigest(), int(encrypted), description, session['username']))
+            conn.commit()
+        except sqlite3.Error as e:
+            # Don't leave an orphaned file behind when the row could not be recorded
+            os.remove(file_path)
+            flash(f'Error saving evidence: {str(e)}', 'error')
+            return redirect(url_for('evidence'))
+        finally:
+            conn.close()
+
         flash('Evidence uploaded successfully!', 'success')
     
     return redirect(url_for('evidence'))
@@ -497,12 +1278,192 @@ def download_evidence(evidence_id):
     evidence = conn.execute('SELECT * FROM evidence WHERE id = ?', (evidence_id,)).fetchone()
     conn.close()
     
+    if evidence and evidence['encrypted']:
+        try:
+            get_evidence_master_key()
+        except (OSError, ValueError) as e:
+            app.logger.error('Evidence master key unavailable: %s', e)
+            flash('Error downloading evidence: encryption key unavailable', 'error')
+            return redirect(url_for('evidence'))
+
+        try:
+            chunks = open_evidence_file(evidence)
+            # The first chunk unwraps the file key, so a damaged header or a file sealed
+            # with another key is reported here rather than as a broken download
+            first = next(chunks)
+        except (InvalidTag, ValueError):
+            app.logger.error('Evidence #%s failed authentication and was not downloaded', evidence_id)
+            flash('Evidence file failed its integrity check and was not downloaded!', 'error')
+            return redirect(url_for('evidence'))
+
+        # Decrypt chunk by chunk as the response is sent
+        mimetype = mimetypes.guess_type(evidence['original_filename'])[0] or 'application/octet-stream'
+        response = Response(_stream_decrypted_evidence(evidence, first, chunks), mimetype=mimetype, direct_passthrough=True)
+        response.headers.set('Content-Disposition', 'attachment', filename=evidence['original_filename'])
+        if evidence['file_size'] is not None:
+            response.content_length = evidence['file_size']
+        return response
+
     if evidence:
         return send_file(evidence['file_path'], as_attachment=True, download_name=evidence['original_filename'])
     
     flash('Evidence not found!', 'error')
     return redirect(url_for('evidence'))
 
+@app.route('/evidence/export')
+@login_required
+def export_evidence():
+    """Stream a ZIP package of evidence, one folder per requirement, with a hash manifest"""
+    requirement_ids = request.args.getlist('requirement_id')
+    evidence_ids = request.args.getlist('evidence_id', type=int)
+
+    query = '''
+        SELECT e.*, h.title as requirement_title
+        FROM evidence e
+        LEFT JOIN pci_requirements h ON e.requirement_id = h.requirement_id
+    '''
+    conditions = []
+    params = []
+    if requirement_ids:
+        conditions.append(f"e.requirement_id IN ({','.join('?' * len(requirement_ids))})")
+        params.extend(requirement_ids)
+    if evidence_ids:
+        conditions.append(f"e.id IN ({','.join('?' * len(evidence_ids))})")
+        params.extend(evidence_ids)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY e.requirement_id, e.uploaded_at'
+
+    conn = get_db_connection()
+    evidence_rows = conn.execute(query, params).fetchall()
+    conn.close()
+
+    if not evidence_rows:
+        flash('No evidence matches the export selection!', 'error')
+        return redirect(url_for('evidence'))
+
+    if any(evidence['encrypted'] for evidence in evidence_rows):
+        try:
+            get_evidence_master_key()
+        except (OSError, ValueError) as e:
+            app.logger.error('Evidence master key unavailable: %s', e)
+            flash('Error exporting evidence: encryption key unavailable', 'error')
+            return redirect(url_for('evidence'))
+
+    if len(requirement_ids) == 1:
+        package_name = f"evidence_{secure_filename(requirement_ids[0])}"
+    else:
+        package_name = 'evidence_full_assessment'
+    package_name += f"_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+
+    return Response(stream_with_context(iter_evidence_package(evidence_rows, session['username'])),
+                    mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{package_name}"'})
+
+@app.route('/coverage')
+@login_required
+def coverage_matrix():
+    """Requirement-to-evidence coverage matrix"""
+    conn = get_db_connection()
+    coverage = get_evidence_coverage(conn)
+    conn.close()
+
+    # Group by category for the matrix view
+    categories = {}
+    for item in coverage['requirements']:
+        categories.setdefault(item['category'], []).append(item)
+
+    return render_template('coverage.html', categories=categories, summary=coverage['summary'])
+
+@app.route('/api/coverage')
+@login_required
+def api_coverage():
+    """Coverage matrix as JSON, ?missing=1 returns only requirements without evidence"""
+    conn = get_db_connection()
+    coverage = get_evidence_coverage(conn)
+    conn.close()
+
+    requirements = coverage['requirements']
+    if request.args.get('missing') == '1':
+        requirements = [item for item in requirements if item['missing_evidence']]
+
+    return jsonify({'summary': coverage['summary'], 'requirements': requirements})
+
+@app.route('/api/sync/changes')
+@login_required
+def api_sync_changes():
+    """Rows changed since the client's cursor, for offline-capable clients"""
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', app.config['SYNC_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['SYNC_PAGE_SIZE']))
+
+    conn = get_db_connection()
+    result = get_changes_since(conn, cursor, limit)
+    conn.close()
+
+    return jsonify(result)
+
+@app.route('/api/metrics/payload')
+@login_required
+def api_payload_metrics():
+    """Response size metrics per endpoint, largest pages first"""
+    metrics = payload_metrics.snapshot()
+    for stats in metrics.values():
+        stats['avg_raw_bytes'] = stats['raw_bytes'] // stats['requests']
+        stats['compression_ratio'] = round(stats['sent_bytes'] / stats['raw_bytes'], 3) if stats['raw_bytes'] else None
+    ordered = sorted(metrics.items(), key=lambda item: item[1]['max_raw_bytes'], reverse=True)
+    return jsonify([dict(stats, endpoint=endpoint) for endpoint, stats in ordered])
+
+@app.route('/api/service-providers/due')
+@login_required
+def api_service_providers_due():
+    """Overdue service provider assessments and those due in each of the next ?weeks=N weeks"""
+    weeks = request.args.get('weeks', app.config['SP_DUE_WEEKS'], type=int)
+    weeks = max(1, min(weeks, 52))
+
+    conn = get_db_connection()
+    schedule = get_assessment_schedule(conn, weeks)
+    conn.close()
+
+    return jsonify(schedule)
+
+@app.route('/api/versions/check', methods=['POST'])
+@login_required
+def api_check_versions():
+    """Batch conflict detection: which of the client's row versions are stale"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('rows', []), list):
+        return jsonify({'error': 'Expected a JSON object with a list of rows'}), 400
+
+    rows = []
+    for item in payload.get('rows', []):
+        if not isinstance(item, dict):
+            return jsonify({'error': 'Each row must be an object'}), 400
+        table = item.get('table')
+        if not isinstance(table, str) or table not in ROW_VERSIONED_TABLES:
+            return jsonify({'error': f'Unknown table: {table}'}), 400
+        try:
+            if not isinstance(item['id'], (int, str)) or isinstance(item['row_version'], bool):
+                raise TypeError
+            key = int(item['id']) if ROW_VERSIONED_TABLES[table] == 'id' else str(item['id'])
+            rows.append({'table': table, 'id': key, 'row_version': int(item['row_version'])})
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each row needs table, id and row_version'}), 400
+
+    conn = get_db_connection()
+    conflicts = find_version_conflicts(conn, rows)
+    conn.close()
+
+    return jsonify({'checked': len(rows), 'conflicts': conflicts})
+
+@app.route('/sw.js')
+def service_worker():
+    """Serve the service worker from the site root so it can control every page"""
+    response = send_from_directory(os.path.join(app.root_path, 'static', 'js'), 'sw.js',
+                                   mimetype='application/javascript', max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/evidence/delete/<int:evidence_id>', methods=['POST'])
 @login_required
 def delete_evidence(evidence_id):
@@ -514,11 +1475,17 @@ def delete_evidence(evidence_id):
         # Delete file from filesystem
         try:
             os.remove(evidence['file_path'])
-        except:
+        except FileNotFoundError:
+            # Already gone, still drop the dangling row
             pass
-        
+        except OSError as e:
+            conn.close()
+            flash(f'Error deleting evidence file: {str(e)}', 'error')
+            return redirect(url_for('evidence'))
+
         # Delete from database
         conn.execute('DELETE FROM evidence WHERE id = ?', (evidence_id,))
+        conn.execute('DELETE FROM evidence_scan_state WHERE file_path = ?', (os.path.normpath(evidence['file_path']),))
         conn.commit()
         flash('Evidence deleted successfully!', 'success')
     else:
@@ -568,25 +1535,26 @@ def add_risk():
 @login_required
 def update_risk(risk_id):
     """Update existing risk"""
-    title = request.form['title']
-    description = request.form['description']
-    likelihood = int(request.form['likelihood'])
-    impact = int(request.form['impact'])
-    mitigation = request.form.get('mitigation', '')
-    owner = request.form.get('owner', '')
-    status = request.form.get('status', 'Open')
+    data = request_data('title', 'description', 'likelihood', 'impact')
+    title = data['title']
+    description = data['description']
+    likelihood = data.get('likelihood', type=int)
+    impact = data.get('impact', type=int)
+    if likelihood not in range(1, 6) or impact not in range(1, 6):
+        abort(400, 'likelihood and impact must be integers from 1 to 5')
+    mitigation = data.get('mitigation', '')
+    owner = data.get('owner', '')
+    status = data.get('status', 'Open')
     
     conn = get_db_connection()
-    conn.execute('''
-        UPDATE risks 
-        SET title = ?, description = ?, likelihood = ?, impact = ?, mitigation = ?, owner = ?, status = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (title, description, likelihood, impact, mitigation, owner, status, risk_id))
-    conn.commit()
-    conn.close()
+    try:
+        updated, current = compare_and_swap(conn, 'risks', risk_id, submitted_row_version(data),
+            'title = ?, description = ?, likelihood = ?, impact = ?, mitigation = ?, owner = ?, status = ?, updated_at = CURRENT_TIMESTAMP',
+            (title, description, likelihood, impact, mitigation, owner, status))
+    finally:
+        conn.close()
     
-    flash('Risk updated successfully!', 'success')
-    return redirect(url_for('risk_register'))
+    return row_update_response(updated, current, 'Risk', 'risk_register')
 
 @app.route('/risks/delete/<int:risk_id>', methods=['POST'])
 @login_required
@@ -638,24 +1606,23 @@ def add_cardholder_data_type():
 @login_required
 def update_cardholder_data_type(data_id):
     """Update existing cardholder data type"""
-    data_type = request.form['data_type']
-    description = request.form.get('description', '')
-    classification = request.form['classification']
-    storage_location = request.form.get('storage_location', '')
-    encryption_status = request.form.get('encryption_status', '')
-    disposal_procedures = request.form.get('disposal_procedures', '')
+    data = request_data('data_type', 'classification')
+    data_type = data['data_type']
+    description = data.get('description', '')
+    classification = data['classification']
+    storage_location = data.get('storage_location', '')
+    encryption_status = data.get('encryption_status', '')
+    disposal_procedures = data.get('disposal_procedures', '')
     
     conn = get_db_connection()
-    conn.execute('''
-        UPDATE cardholder_data_tracking 
-        SET data_type = ?, description = ?, classification = ?, storage_location = ?, encryption_status = ?, disposal_procedures = ?, updated_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (data_type, description, classification, storage_location, encryption_status, disposal_procedures, data_id))
-    conn.commit()
-    conn.close()
+    try:
+        updated, current = compare_and_swap(conn, 'cardholder_data_tracking', data_id, submitted_row_version(data),
+            'data_type = ?, description = ?, classification = ?, storage_location = ?, encryption_status = ?, disposal_procedures = ?, updated_at = CURRENT_TIMESTAMP',
+            (data_type, description, classification, storage_location, encryption_status, disposal_procedures))
+    finally:
+        conn.close()
     
-    flash('Cardholder data type updated successfully!', 'success')
-    return redirect(url_for('cardholder_data_tracking'))
+    return row_update_response(updated, current, 'Cardholder data type', 'cardholder_data_tracking')
 
 @app.route('/cardholder-data-tracking/delete/<int:data_id>', methods=['POST'])
 @login_required
@@ -692,8 +1659,12 @@ def add_service_provider():
     contract_status = request.form.get('contract_status', 'Active')
     compliance_status = request.form.get('compliance_status', 'Not Assessed')
     pci_level = request.form.get('pci_level', '')
-    last_assessment_date = request.form.get('last_assessment_date')
-    next_assessment_date = request.form.get('next_assessment_date')
+    try:
+        last_assessment_date = parse_iso_date(request.form.get('last_assessment_date'))
+        next_assessment_date = parse_iso_date(request.form.get('next_assessment_date'))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('service_providers'))
     
     conn = get_db_connection()
     conn.execute('''
@@ -710,27 +1681,32 @@ def add_service_provider():
 @login_required
 def edit_service_provider(sp_id):
     """Edit Service Provider"""
-    name = request.form['name']
-    contact_person = request.form.get('contact_person', '')
-    email = request.form.get('email', '')
-    phone = request.form.get('phone', '')
-    contract_status = request.form.get('contract_status', 'Active')
-    compliance_status = request.form.get('compliance_status', 'Not Assessed')
-    pci_level = request.form.get('pci_level', '')
-    last_assessment_date = request.form.get('last_assessment_date')
-    next_assessment_date = request.form.get('next_assessment_date')
+    data = request_data('name')
+    name = data['name']
+    contact_person = data.get('contact_person', '')
+    email = data.get('email', '')
+    phone = data.get('phone', '')
+    contract_status = data.get('contract_status', 'Active')
+    compliance_status = data.get('compliance_status', 'Not Assessed')
+    pci_level = data.get('pci_level', '')
+    try:
+        last_assessment_date = parse_iso_date(data.get('last_assessment_date'))
+        next_assessment_date = parse_iso_date(data.get('next_assessment_date'))
+    except ValueError as e:
+        if wants_json():
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('service_providers'))
     
     conn = get_db_connection()
-    conn.execute('''
-        UPDATE service_providers 
-        SET name = ?, contact_person = ?, email = ?, phone = ?, contract_status = ?, compliance_status = ?, pci_level = ?, last_assessment_date = ?, next_assessment_date = ?
-        WHERE id = ?
-    ''', (name, contact_person, email, phone, contract_status, compliance_status, pci_level, last_assessment_date, next_assessment_date, sp_id))
-    conn.commit()
-    conn.close()
+    try:
+        updated, current = compare_and_swap(conn, 'service_providers', sp_id, submitted_row_version(data),
+            'name = ?, contact_person = ?, email = ?, phone = ?, contract_status = ?, compliance_status = ?, pci_level = ?, last_assessment_date = ?, next_assessment_date = ?, updated_at = CURRENT_TIMESTAMP',
+            (name, contact_person, email, phone, contract_status, compliance_status, pci_level, last_assessment_date, next_assessment_date))
+    finally:
+        conn.close()
     
-    flash('Service Provider updated successfully!', 'success')
-    return redirect(url_for('service_providers'))
+    return row_update_response(updated, current, 'Service Provider', 'service_providers')
 
 @app.route('/service-providers/delete/<int:sp_id>', methods=['POST'])
 @login_required
@@ -801,6 +1777,10 @@ def generate_report():
             
             # Get evidence count
             evidence_count = len(evidence) if evidence else 0
+
+            # Requirements with no evidence attached
+            coverage = get_evidence_coverage(conn)
+            coverage_gaps = [item for item in coverage['requirements'] if item['missing_evidence']]
             
             # Get risk statistics
             high_risks = len([r for r in risks if r['risk_score'] >= 15]) if risks else 0
@@ -811,6 +1791,7 @@ def generate_report():
             
             return render_template('report.html',
                                  report_type='PCI DSS Compliance Report',
+                                 coverage_gaps=coverage_gaps,
                                  requirements=requirements or [],
                                  evidence=evidence or [],
                                  risks=risks or [],
@@ -892,6 +1873,770 @@ def generate_report():
         flash(f'Error generating report: {str(e)}', 'error')
         return redirect(url_for('reports'))
 
+# Delta sync
+# Columns that stay on the server
+SYNC_EXCLUDED_COLUMNS = {'evidence': {'file_path'}}
+
+def _sync_rows(conn, table, ids=None):
+    """Fetch rows of a synced table as dicts, optionally limited to ids"""
+    query = f'SELECT * FROM {table}'
+    params = []
+    if ids is not None:
+        query += f" WHERE id IN ({','.join('?' * len(ids))})"
+        params = list(ids)
+    excluded = SYNC_EXCLUDED_COLUMNS.get(table, set())
+    return [{key: row[key] for key in row.keys() if key not in excluded}
+            for row in conn.execute(query, params).fetchall()]
+
+def get_changes_since(conn, cursor, limit):
+    """Collapse change_log entries after cursor into per-table upserts and deletes.
+
+    No cursor (a new client), or one the pruned log can no longer serve, gets
+    a full snapshot with ``reset`` set so the client replaces its local copy.
+    """
+    conn.execute('BEGIN')  # Consistent snapshot across the reads below
+    try:
+        # Highest seq ever assigned, which survives pruning the log empty
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        latest = row['seq'] if row else 0
+        first = conn.execute('SELECT MIN(seq) FROM change_log').fetchone()[0]
+        if first is None:
+            first = latest + 1
+
+        if cursor is None or cursor > latest or cursor < first - 1:
+            changes = {table: {'upserts': _sync_rows(conn, table), 'deletes': []} for table in VERSIONED_TABLES}
+            return {'cursor': latest, 'has_more': False, 'reset': True, 'changes': changes}
+
+        entries = conn.execute('''
+            SELECT seq, table_name, row_id, operation FROM change_log
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        ''', (cursor, limit)).fetchall()
+
+        # Last operation per row wins
+        latest_ops = {}
+        for entry in entries:
+            latest_ops[(entry['table_name'], entry['row_id'])] = entry['operation']
+
+        changes = {}
+        for table in VERSIONED_TABLES:
+            upsert_ids = [row_id for (name, row_id), op in latest_ops.items() if name == table and op == 'upsert']
+            delete_ids = [row_id for (name, row_id), op in latest_ops.items() if name == table and op == 'delete']
+            if upsert_ids or delete_ids:
+                changes[table] = {
+                    'upserts': _sync_rows(conn, table, upsert_ids) if upsert_ids else [],
+                    'deletes': delete_ids,
+                }
+
+        new_cursor = entries[-1]['seq'] if entries else cursor
+        return {'cursor': new_cursor, 'has_more': new_cursor < latest, 'reset': False, 'changes': changes}
+    finally:
+        conn.rollback()
+
+def prune_change_log():
+    """Drop change_log entries older than SYNC_LOG_RETENTION_DAYS"""
+    conn = get_db_connection()
+    conn.execute("DELETE FROM change_log WHERE changed_at < datetime('now', ?)",
+                 (f"-{app.config['SYNC_LOG_RETENTION_DAYS']} days",))
+    conn.commit()
+    conn.close()
+
+# Evidence encryption at rest
+EVIDENCE_MAGIC = b'ACEPENC1'
+# magic, plaintext chunk size, key-wrap nonce, wrapped data key (32 bytes + tag), chunk nonce prefix
+_EVIDENCE_HEADER = struct.Struct('>8sI12s48s7s')
+_GCM_TAG_SIZE = 16
+
+_evidence_master_key = None
+_evidence_master_key_lock = threading.Lock()
+
+def get_evidence_master_key():
+    """The 256-bit key that wraps the per-file evidence keys.
+
+    Read from ACEP_EVIDENCE_KEY (base64) when set, otherwise from
+    EVIDENCE_KEY_FILE, which is generated with owner-only permissions on
+    first use.
+    """
+    global _evidence_master_key
+    with _evidence_master_key_lock:
+        if _evidence_master_key is None:
+            encoded = os.environ.get('ACEP_EVIDENCE_KEY')
+            if encoded is None:
+                key_file = app.config['EVIDENCE_KEY_FILE']
+                try:
+                    fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except FileExistsError:
+                    with open(key_file) as f:
+                        encoded = f.read().strip()
+                else:
+                    encoded = base64.b64encode(AESGCM.generate_key(bit_length=256)).decode()
+                    with os.fdopen(fd, 'w') as f:
+                        f.write(encoded + '\n')
+
+            key = base64.b64decode(encoded)
+            if len(key) != 32:
+                raise ValueError('Evidence master key must be 32 bytes, base64-encoded')
+            _evidence_master_key = key
+        return _evidence_master_key
+
+def _chunk_nonce(prefix, counter, final):
+    # The counter and last-chunk flag are part of the nonce, so reordered,
+    # dropped or truncated chunks fail authentication
+    return prefix + struct.pack('>IB', counter, final)
+
+class EvidenceEncryptor:
+    """Encrypts evidence written to ``out`` as a sequence of AES-GCM chunks.
+
+    Every file gets its own random data key, stored in the header wrapped by
+    the master key. No more than two chunks are held in memory whatever the
+    file size.
+    """
+
+    def __init__(self, out, master_key, chunk_size=EVIDENCE_CHUNK_SIZE):
+        data_key = AESGCM.generate_key(bit_length=256)
+        wrap_nonce = os.urandom(12)
+        wrapped_key = AESGCM(master_key).encrypt(wrap_nonce, data_key, EVIDENCE_MAGIC)
+        self._prefix = os.urandom(7)
+        self._header = _EVIDENCE_HEADER.pack(EVIDENCE_MAGIC, chunk_size, wrap_nonce, wrapped_key, self._prefix)
+        self._aesgcm = AESGCM(data_key)
+        self._out = out
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._counter = 0
+        out.write(self._header)
+
+    def write(self, data):
+        self._buffer += data
+        # Always hold back the last full chunk: only finish() knows which chunk is final
+        while len(self._buffer) > self._chunk_size:
+            self._seal(bytes(self._buffer[:self._chunk_size]), final=False)
+            del self._buffer[:self._chunk_size]
+
+    def finish(self):
+        self._seal(bytes(self._buffer), final=True)
+        self._buffer = bytearray()
+
+    def _seal(self, plaintext, final):
+        nonce = _chunk_nonce(self._prefix, self._counter, final)
+        self._out.write(self._aesgcm.encrypt(nonce, plaintext, self._header))
+        self._counter += 1
+
+def iter_decrypted_evidence(f, master_key):
+    """Yield the plaintext of an encrypted evidence file, one authenticated chunk at a time.
+
+    Raises InvalidTag if the file was modified, truncated or sealed with another key.
+    """
+    header = f.read(_EVIDENCE_HEADER.size)
+    if len(header) != _EVIDENCE_HEADER.size or not header.startswith(EVIDENCE_MAGIC):
+        raise ValueError('Not an encrypted evidence file')
+    _, chunk_size, wrap_nonce, wrapped_key, prefix = _EVIDENCE_HEADER.unpack(header)
+    # The header is only authenticated with the first chunk, so don't trust it as a read size
+    if chunk_size != EVIDENCE_CHUNK_SIZE:
+        raise ValueError(f'Unsupported evidence chunk size: {chunk_size}')
+    aesgcm = AESGCM(AESGCM(master_key).decrypt(wrap_nonce, wrapped_key, EVIDENCE_MAGIC))
+
+    sealed_size = chunk_size + _GCM_TAG_SIZE
+    counter = 0
+    sealed = f.read(sealed_size)
+    while True:
+        # A full chunk may still be the last one, so look one chunk ahead
+        following = f.read(sealed_size) if len(sealed) == sealed_size else b''
+        final = not following
+        yield aesgcm.decrypt(_chunk_nonce(prefix, counter, final), sealed, header)
+        if final:
+            return
+        sealed = following
+        counter += 1
+
+# Evidence package export
+# Formats that are already compressed; deflating them again only burns CPU
+STORED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'zip', 'rar', 'mp4', 'avi', 'mov', 'docx', 'xlsx', 'pptx'}
+
+def open_evidence_file(evidence):
+    """Open an evidence file and return an iterator over its contents in EVIDENCE_CHUNK_SIZE blocks.
+
+    The file is opened eagerly so a missing file raises here rather than mid-stream.
+    Encrypted files are decrypted and authenticated as they are read.
+    """
+    master_key = get_evidence_master_key() if evidence['encrypted'] else None
+    f = open(evidence['file_path'], 'rb')
+
+    def chunks():
+        with f:
+            if master_key is not None:
+                yield from iter_decrypted_evidence(f, master_key)
+                return
+            for chunk in iter(lambda: f.read(EVIDENCE_CHUNK_SIZE), b''):
+                yield chunk
+
+    return chunks()
+
+def _stream_decrypted_evidence(evidence, first, chunks):
+    """Yield a decrypted evidence download, logging a file that fails authentication part-way.
+
+    The headers are already sent by then, so the response is cut short of its
+    Content-Length and the client sees an incomplete download.
+    """
+    yield first
+    try:
+        yield from chunks
+    except (InvalidTag, ValueError):
+        app.logger.error('Evidence #%s failed authentication part-way through a download; the response was cut short',
+                         evidence['id'])
+        raise
+
+class _ZipStream:
+    """Write-only file object that buffers ZIP output until the generator drains it.
+
+    It has no tell()/seek(), so zipfile writes entries in streaming mode with
+    data descriptors instead of seeking back to patch local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _zip_date_time(timestamp):
+    """Convert a SQLite timestamp to a ZipInfo date_time tuple"""
+    try:
+        value = datetime.strptime(str(timestamp)[:19], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        value = datetime.now()
+    return max(value, datetime(1980, 1, 1)).timetuple()[:6]
+
+def iter_evidence_package(evidence_rows, generated_by):
+    """Generate a ZIP archive of evidence files on the fly.
+
+    Files are read and written one chunk at a time, so memory use does not
+    depend on the size of the evidence set. manifest.json is written last,
+    with the SHA-256 of each file as it was actually packaged.
+    """
+    stream = _ZipStream()
+    manifest = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'generated_by': generated_by,
+        'files': [],
+    }
+
+    with zipfile.ZipFile(stream, 'w', allowZip64=True) as archive:
+        for evidence in evidence_rows:
+            arcname = f"{secure_filename(evidence['requirement_id']) or 'unlinked'}/{evidence['id']}_{evidence['original_filename']}"
+            entry = {
+                'id': evidence['id'],
+                'requirement_id': evidence['requirement_id'],
+                'requirement_title': evidence['requirement_title'],
+                'path': arcname,
+                'original_filename': evidence['original_filename'],
+                'description': evidence['description'],
+                'uploaded_by': evidence['uploaded_by'],
+                'uploaded_at': evidence['uploaded_at'],
+                'recorded_sha256': evidence['file_hash'],
+            }
+
+            zinfo = zipfile.ZipInfo(arcname, date_time=_zip_date_time(evidence['uploaded_at']))
+            ext = evidence['original_filename'].lower().rsplit('.', 1)[-1]
+            zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            # Size hint so zipfile switches to ZIP64 headers for very large files
+            zinfo.file_size = evidence['file_size'] or 0
+
+            sha256 = hashlib.sha256()
+            size = 0
+            try:
+                chunks = open_evidence_file(evidence)
+            except FileNotFoundError:
+                entry['missing'] = True
+                manifest['files'].append(entry)
+                continue
+
+            failed = False
+            with archive.open(zinfo, 'w') as dest:
+                try:
+                    for chunk in chunks:
+                        sha256.update(chunk)
+                        size += len(chunk)
+                        dest.write(chunk)
+                        yield stream.drain()
+                except (InvalidTag, ValueError):
+                    # Tampered, truncated or sealed with another key; the entry holds only
+                    # what authenticated, and the rest of the package is still written
+                    app.logger.error('Evidence #%s failed authentication during export', evidence['id'])
+                    failed = True
+
+            entry['size'] = size
+            entry['sha256'] = sha256.hexdigest()
+            entry['verified'] = not failed and entry['sha256'] == evidence['file_hash']
+            if failed:
+                entry['error'] = 'failed authentication'
+            manifest['files'].append(entry)
+            yield stream.drain()
+
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2, default=str),
+                         compress_type=zipfile.ZIP_DEFLATED)
+
+    yield stream.drain()
+
+# Evidence store maintenance
+def _hash_file(file_path, master_key=None):
+    """Return (sha256 hex digest, size) of a file, or None if it cannot be read.
+
+    With ``master_key`` the file is decrypted and the plaintext is hashed; the
+    digest is None if it fails authentication. Module-level so it can run in a
+    ProcessPoolExecutor worker.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_path, 'rb') as f:
+            if master_key is not None:
+                chunks = iter_decrypted_evidence(f, master_key)
+            else:
+                chunks = iter(lambda: f.read(EVIDENCE_CHUNK_SIZE), b'')
+            for chunk in chunks:
+                sha256.update(chunk)
+                size += len(chunk)
+    except OSError:
+        return None
+    except (InvalidTag, ValueError):
+        return None, size
+    return sha256.hexdigest(), size
+
+def _hash_files(paths, workers=None, encrypted=None):
+    """Hash many files, across a process pool when there is more than one"""
+    workers = workers or app.config['EVIDENCE_SCAN_WORKERS']
+    encrypted = encrypted or [False] * len(paths)
+    master_key = get_evidence_master_key() if any(encrypted) else None
+    keys = [master_key if flag else None for flag in encrypted]
+    if len(paths) > 1 and workers != 1:
+        # Never fork: this runs from background threads of a threaded server, and a
+        # forked child can inherit locks (logging, sqlite) held by another thread
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            return list(executor.map(_hash_file, paths, keys, chunksize=16))
+    return [_hash_file(path, key) for path, key in zip(paths, keys)]
+
+def scan_evidence_store(full=False, reclaim=False, workers=None):
+    """Cross-check the upload folder against the evidence table.
+
+    Files are hashed across a process pool. Unless ``full`` is set, files whose
+    size and mtime match the last checkpoint are not re-hashed. With ``reclaim``
+    orphaned files older than EVIDENCE_ORPHAN_GRACE are deleted.
+    """
+    upload_folder = app.config['UPLOAD_FOLDER']
+    report = {'verified': [], 'skipped': [], 'baselined': [], 'missing': [],
+              'tampered': [], 'orphaned': [], 'reclaimed': [], 'reclaimed_bytes': 0}
+
+    # Everything currently in the upload folder, keyed by normalized path
+    on_disk = {}
+    with os.scandir(upload_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith('.'):
+                on_disk[os.path.normpath(entry.path)] = entry.stat()
+
+    conn = get_db_connection()
+    rows = conn.execute('SELECT id, file_path, file_size, file_hash, encrypted FROM evidence').fetchall()
+    checkpoints = {cp['file_path']: cp for cp in conn.execute('SELECT * FROM evidence_scan_state').fetchall()}
+
+    to_hash = []
+    for row in rows:
+        path = os.path.normpath(row['file_path'])
+        stat = on_disk.pop(path, None)
+        if stat is None:
+            report['missing'].append({'id': row['id'], 'file_path': row['file_path']})
+            continue
+
+        checkpoint = checkpoints.get(path)
+        if (not full and checkpoint
+                and checkpoint['file_size'] == stat.st_size
+                and checkpoint['mtime'] == stat.st_mtime
+                and checkpoint['sha256'] == row['file_hash']):
+            report['skipped'].append(row['id'])
+            continue
+        to_hash.append((row, path, stat))
+
+    # Whatever is left on disk has no evidence row
+    now = time.time()
+    for path, stat in on_disk.items():
+        report['orphaned'].append({'file_path': path, 'file_size': stat.st_size,
+                                   'age_seconds': int(now - stat.st_mtime)})
+
+    digests = _hash_files([path for _, path, _ in to_hash], workers,
+                          [row['encrypted'] for row, _, _ in to_hash])
+
+    for (row, path, stat), result in zip(to_hash, digests):
+        if result is None:
+            report['missing'].append({'id': row['id'], 'file_path': row['file_path']})
+            continue
+        digest, size = result
+
+        if digest is None:
+            # Encrypted file failed authentication; keep re-checking it on every scan
+            report['tampered'].append({'id': row['id'], 'file_path': row['file_path'],
+                                       'expected': row['file_hash'], 'actual': 'failed decryption'})
+            continue
+
+        if row['file_hash'] is None:
+            # Uploaded before hashes were recorded, take the current content as the baseline
+            conn.execute('UPDATE evidence SET file_hash = ? WHERE id = ?', (digest, row['id']))
+            report['baselined'].append(row['id'])
+        elif digest != row['file_hash'] or (row['file_size'] is not None and size != row['file_size']):
+            report['tampered'].append({'id': row['id'], 'file_path': row['file_path'],
+                                       'expected': row['file_hash'], 'actual': digest})
+        else:
+            report['verified'].append(row['id'])
+
+        conn.execute('''
+            INSERT OR REPLACE INTO evidence_scan_state (file_path, file_size, mtime, sha256, scanned_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (path, stat.st_size, stat.st_mtime, digest))
+
+    if reclaim:
+        grace = app.config['EVIDENCE_ORPHAN_GRACE']
+        for orphan in report['orphaned']:
+            if orphan['age_seconds'] < grace:
+                continue
+            try:
+                os.remove(orphan['file_path'])
+            except FileNotFoundError:
+                continue
+            report['reclaimed'].append(orphan['file_path'])
+            report['reclaimed_bytes'] += orphan['file_size']
+
+    # Forget checkpoints for files that no longer belong to an evidence row
+    known_paths = {os.path.normpath(row['file_path']) for row in rows}
+    stale = [(path,) for path in checkpoints if path not in known_paths]
+    conn.executemany('DELETE FROM evidence_scan_state WHERE file_path = ?', stale)
+
+    conn.commit()
+    conn.close()
+
+    app.logger.info('Evidence scan: %d verified, %d skipped, %d baselined, %d missing, %d tampered, %d orphaned, %d reclaimed',
+                    len(report['verified']), len(report['skipped']), len(report['baselined']),
+                    len(report['missing']), len(report['tampered']), len(report['orphaned']),
+                    len(report['reclaimed']))
+    return report
+
+@app.cli.command('scan-evidence')
+@click.option('--full', is_flag=True, help='Re-hash every file instead of skipping unchanged ones.')
+@click.option('--reclaim', is_flag=True, help='Delete orphaned files older than the grace period.')
+@click.option('--workers', type=int, default=None, help='Number of hashing processes.')
+def scan_evidence_command(full, reclaim, workers):
+    """Verify evidence files against the database and report problems."""
+    init_database()
+    report = scan_evidence_store(full=full, reclaim=reclaim, workers=workers)
+
+    click.echo(f"Verified:  {len(report['verified'])}")
+    click.echo(f"Skipped:   {len(report['skipped'])} (unchanged since last scan)")
+    click.echo(f"Baselined: {len(report['baselined'])}")
+    for item in report['missing']:
+        click.echo(f"MISSING   evidence #{item['id']}: {item['file_path']}")
+    for item in report['tampered']:
+        click.echo(f"TAMPERED  evidence #{item['id']}: {item['file_path']} (expected {item['expected']}, got {item['actual']})")
+    for item in report['orphaned']:
+        click.echo(f"ORPHANED  {item['file_path']} ({format_file_size(item['file_size'])})")
+    if reclaim:
+        click.echo(f"Reclaimed {len(report['reclaimed'])} files, {format_file_size(report['reclaimed_bytes'])}")
+
+    if report['missing'] or report['tampered']:
+        raise SystemExit(1)
+
+def encrypt_evidence_store():
+    """Encrypt evidence files stored before encryption at rest was enabled.
+
+    Each file is encrypted to a new ``.enc`` path and the row is switched over
+    before the plaintext is removed, so an interrupted run leaves at worst an
+    orphan for the integrity scanner to reclaim.
+    """
+    master_key = get_evidence_master_key()
+    report = {'encrypted': [], 'missing': [], 'modified': []}
+
+    conn = get_db_connection()
+    rows = conn.execute('SELECT id, file_path, file_hash FROM evidence WHERE encrypted = 0').fetchall()
+    for row in rows:
+        encrypted_path = row['file_path'] + '.enc'
+        sha256 = hashlib.sha256()
+        try:
+            with open(row['file_path'], 'rb') as src, open(encrypted_path, 'wb') as out:
+                encryptor = EvidenceEncryptor(out, master_key)
+                for chunk in iter(lambda: src.read(EVIDENCE_CHUNK_SIZE), b''):
+                    sha256.update(chunk)
+                    encryptor.write(chunk)
+                encryptor.finish()
+        except FileNotFoundError:
+            report['missing'].append({'id': row['id'], 'file_path': row['file_path']})
+            continue
+
+        if row['file_hash'] is not None and sha256.hexdigest() != row['file_hash']:
+            # Don't seal content that no longer matches what was uploaded
+            os.remove(encrypted_path)
+            report['modified'].append({'id': row['id'], 'file_path': row['file_path']})
+            continue
+
+        cursor = conn.execute('''
+            UPDATE evidence SET file_path = ?, file_hash = ?, encrypted = 1
+            WHERE id = ? AND encrypted = 0
+        ''', (encrypted_path, sha256.hexdigest(), row['id']))
+        conn.commit()
+        if cursor.rowcount == 0:
+            # Deleted or already encrypted by another run in the meantime
+            os.remove(encrypted_path)
+            continue
+
+        try:
+            os.remove(row['file_path'])
+        except FileNotFoundError:
+            pass
+        report['encrypted'].append(row['id'])
+
+    conn.close()
+    return report
+
+@app.cli.command('encrypt-evidence')
+def encrypt_evidence_command():
+    """Encrypt evidence uploaded before encryption at rest was enabled."""
+    init_database()
+    report = encrypt_evidence_store()
+
+    for item in report['missing']:
+        click.echo(f"MISSING   evidence #{item['id']}: {item['file_path']}")
+    for item in report['modified']:
+        click.echo(f"MODIFIED  evidence #{item['id']}: {item['file_path']} (left unencrypted, run scan-evidence)")
+    click.echo(f"Encrypted {len(report['encrypted'])} file(s)")
+
+    if report['missing'] or report['modified']:
+        raise SystemExit(1)
+
+# Database backups
+BACKUP_NAME_PATTERN = re.compile(r'^pci_dss_audit_\d{8}_\d{6}\.db$')
+PRE_RESTORE_NAME_PATTERN = re.compile(r'^pre_restore_\d{8}_\d{6}\.db$')
+
+def _pause_between_backup_steps(status, remaining, total):
+    """Backup progress callback: give writers a window between page batches"""
+    time.sleep(app.config['BACKUP_STEP_PAUSE'])
+
+def _backup_manifest_path(backup_path):
+    return backup_path + '.manifest.json'
+
+def create_backup(include_evidence=None):
+    """Take an online snapshot of the database with SQLite's backup API.
+
+    Pages are copied in BACKUP_PAGES_PER_STEP batches with a pause in
+    between, so the source is only read-locked briefly and live requests
+    keep writing. If another connection writes mid-copy SQLite restarts the
+    copy from the current state, so the snapshot is always consistent.
+    """
+    if include_evidence is None:
+        include_evidence = app.config['BACKUP_INCLUDE_EVIDENCE']
+
+    folder = app.config['BACKUP_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    backup_path = os.path.join(folder, f"pci_dss_audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    partial_path = backup_path + '.partial'
+
+    source = get_db_connection()
+    target = sqlite3.connect(partial_path)
+    try:
+        source.backup(target, pages=app.config['BACKUP_PAGES_PER_STEP'], progress=_pause_between_backup_steps)
+    finally:
+        target.close()
+        source.close()
+
+    if include_evidence:
+        # Read from the snapshot itself so the manifest matches the backed-up rows
+        snapshot = sqlite3.connect(partial_path)
+        snapshot.row_factory = sqlite3.Row
+        evidence_rows = snapshot.execute('SELECT id, requirement_id, file_path, file_size, file_hash, encrypted FROM evidence').fetchall()
+        snapshot.close()
+
+        manifest = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'database': os.path.basename(backup_path),
+            'evidence': [dict(row) for row in evidence_rows],
+        }
+        with open(_backup_manifest_path(backup_path), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    os.replace(partial_path, backup_path)
+    prune_backups()
+
+    app.logger.info('Database backup written to %s', backup_path)
+    return backup_path
+
+def list_backups(pattern=BACKUP_NAME_PATTERN):
+    """Backups in the backup folder matching pattern (scheduled ones by default), newest first"""
+    folder = app.config['BACKUP_FOLDER']
+    if not os.path.isdir(folder):
+        return []
+    names = sorted((name for name in os.listdir(folder) if pattern.match(name)), reverse=True)
+    return [os.path.join(folder, name) for name in names]
+
+def prune_backups():
+    """Delete scheduled backups beyond BACKUP_RETENTION and pre-restore copies beyond BACKUP_PRE_RESTORE_RETENTION"""
+    stale = (list_backups()[app.config['BACKUP_RETENTION']:]
+             + list_backups(PRE_RESTORE_NAME_PATTERN)[app.config['BACKUP_PRE_RESTORE_RETENTION']:])
+    for backup_path in stale:
+        for path in (backup_path, _backup_manifest_path(backup_path)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def verify_backup(backup_path, workers=None):
+    """Check a snapshot's integrity and, if it has a manifest, the evidence files it refers to"""
+    report = {'integrity': None, 'tables': {}, 'evidence_checked': 0,
+              'evidence_missing': [], 'evidence_mismatched': []}
+
+    snapshot = sqlite3.connect(f'file:{os.path.abspath(backup_path)}?mode=ro', uri=True)
+    try:
+        report['integrity'] = snapshot.execute('PRAGMA integrity_check').fetchone()[0]
+        for table in ('users',) + VERSIONED_TABLES:
+            try:
+                report['tables'][table] = snapshot.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            except sqlite3.OperationalError:
+                report['tables'][table] = None
+    finally:
+        snapshot.close()
+
+    manifest_path = _backup_manifest_path(backup_path)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            entries = json.load(f)['evidence']
+        results = _hash_files([entry['file_path'] for entry in entries], workers,
+                              [entry.get('encrypted') for entry in entries])
+        for entry, result in zip(entries, results):
+            report['evidence_checked'] += 1
+            if result is None:
+                report['evidence_missing'].append(entry)
+            elif entry['file_hash'] and result[0] != entry['file_hash']:
+                report['evidence_mismatched'].append(entry)
+
+    report['ok'] = (report['integrity'] == 'ok'
+                    and None not in report['tables'].values()
+                    and not report['evidence_missing']
+                    and not report['evidence_mismatched'])
+    return report
+
+def restore_backup(backup_path):
+    """Copy a snapshot over the live database with the backup API.
+
+    The current database is snapshotted first. Afterwards the data version
+    counters are moved past their pre-restore values and the change log is
+    reset, so in-process caches and sync clients cannot mistake restored data
+    for what they already hold.
+    """
+    safety_path = os.path.join(app.config['BACKUP_FOLDER'], f"pre_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    os.makedirs(app.config['BACKUP_FOLDER'], exist_ok=True)
+
+    live = get_db_connection()
+    try:
+        live_versions = dict(get_data_version(live, *VERSIONED_TABLES))
+        row = live.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        live_seq = row['seq'] if row else 0
+
+        safety = sqlite3.connect(safety_path)
+        live.backup(safety)
+        safety.close()
+
+        snapshot = sqlite3.connect(f'file:{os.path.abspath(backup_path)}?mode=ro', uri=True)
+        snapshot.backup(live, pages=app.config['BACKUP_PAGES_PER_STEP'])
+        snapshot.close()
+    finally:
+        live.close()
+
+    # Bring older snapshots up to the current schema
+    init_database()
+
+    conn = get_db_connection()
+    for table in VERSIONED_TABLES:
+        conn.execute('UPDATE data_versions SET version = ? WHERE table_name = ?', (live_versions.get(table, 0) + 1, table))
+    conn.execute('DELETE FROM change_log')
+    # Snapshots from before delta sync have no sequence row for change_log yet
+    if conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'change_log'", (live_seq + 1,)).rowcount == 0:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', ?)", (live_seq + 1,))
+    conn.commit()
+    conn.close()
+
+    prune_backups()
+
+    return safety_path
+
+@app.cli.command('backup-db')
+@click.option('--no-evidence', is_flag=True, help='Skip the evidence hash manifest.')
+def backup_db_command(no_evidence):
+    """Take an online backup of the audit database."""
+    init_database()
+    backup_path = create_backup(include_evidence=not no_evidence)
+    click.echo(f'Backup written to {backup_path}')
+
+@app.cli.command('restore-db')
+@click.argument('backup_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--verify-only', is_flag=True, help='Check the backup without restoring it.')
+@click.option('--force', is_flag=True, help='Restore even if verification fails.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore_db_command(backup_path, verify_only, force, yes):
+    """Verify a backup and restore it over the live database."""
+    report = verify_backup(backup_path)
+
+    click.echo(f"Integrity check: {report['integrity']}")
+    for table, count in report['tables'].items():
+        click.echo(f"  {table}: {'MISSING' if count is None else count}")
+    click.echo(f"Evidence files checked: {report['evidence_checked']}")
+    for entry in report['evidence_missing']:
+        click.echo(f"MISSING   evidence #{entry['id']}: {entry['file_path']}")
+    for entry in report['evidence_mismatched']:
+        click.echo(f"MISMATCH  evidence #{entry['id']}: {entry['file_path']}")
+
+    if verify_only:
+        if not report['ok']:
+            raise SystemExit(1)
+        return
+
+    if not report['ok'] and not force:
+        raise click.ClickException('Backup failed verification, use --force to restore anyway')
+    if not yes:
+        click.confirm(f'Replace {DATABASE} with {backup_path}?', abort=True)
+
+    safety_path = restore_backup(backup_path)
+    click.echo(f'Restored {backup_path} (previous database saved to {safety_path})')
+
+# Background jobs
+def start_background_job(name, interval, target):
+    """Run target every interval seconds on a daemon thread (interval 0 disables)"""
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                target()
+            except Exception:
+                app.logger.exception('Background job %s failed', name)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+def start_background_jobs():
+    """Start all scheduled maintenance jobs"""
+    start_background_job('evidence-scan', app.config['EVIDENCE_SCAN_INTERVAL'], scan_evidence_store)
+    start_background_job('change-log-prune', 24 * 60 * 60, prune_change_log)
+    start_background_job('database-backup', app.config['BACKUP_INTERVAL'], create_backup)
+    start_background_job('assessment-expiry', app.config['SP_EXPIRY_CHECK_INTERVAL'], assessment_expiry_queue.expire_lapsed)
+
 if __name__ == '__main__':
     init_database()
+    # With debug=True the reloader also runs this block in a watcher process;
+    # only start jobs in the child process that actually serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_jobs()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -223,3 +223,206 @@ function animateCounter(element, start, end, duration = 1000) {
     
     requestAnimationFrame(step);
 }
+
+// Offline field mode: the service worker caches pages and queues edits made
+// without connectivity; here we replay them on reconnect and pull the rows
+// changed since our last sync cursor to drop stale cached pages.
+const OfflineSync = {
+    cursorKey: 'acep_sync_cursor',
+    pollInterval: 60000,
+
+    // Tables rendered by each page, used to tell whether a delta affects what is on screen
+    pageTables: {
+        '/dashboard': ['pci_requirements', 'risks', 'cardholder_data_tracking', 'service_providers'],
+        '/audit': ['pci_requirements'],
+        '/evidence': ['evidence'],
+        '/coverage': ['pci_requirements', 'evidence'],
+        '/risks': ['risks'],
+        '/cardholder-data-tracking': ['cardholder_data_tracking'],
+        '/service-providers': ['service_providers'],
+        '/reports': ['pci_requirements', 'evidence', 'risks']
+    },
+
+    init() {
+        // Only for signed-in pages
+        if (!document.querySelector('.dashboard-layout') || !('serviceWorker' in navigator)) {
+            return;
+        }
+
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.warn('Offline mode unavailable:', error);
+        });
+        navigator.serviceWorker.addEventListener('message', event => this.handleMessage(event.data));
+
+        document.querySelectorAll('a[href$="/logout"]').forEach(link => {
+            link.addEventListener('click', event => {
+                event.preventDefault();
+                this.clearCachedPages().finally(() => { window.location.href = link.href; });
+            });
+        });
+
+        window.addEventListener('online', () => this.reconnect());
+        window.addEventListener('offline', () => this.showStatus('Offline - changes will be queued and synced on reconnect', 'warning'));
+
+        if (navigator.onLine) {
+            this.reconnect();
+        } else {
+            this.showStatus('Offline - showing cached data', 'warning');
+        }
+
+        setInterval(() => {
+            if (navigator.onLine && document.visibilityState === 'visible') {
+                this.pullChanges();
+            }
+        }, this.pollInterval);
+    },
+
+    async reconnect() {
+        const registration = await navigator.serviceWorker.ready;
+        if (registration.active) {
+            registration.active.postMessage({ type: 'replay' });
+        }
+        await this.pullChanges();
+    },
+
+    handleMessage(message) {
+        if (!message) return;
+        switch (message.type) {
+            case 'queued':
+                this.showStatus(`Offline - ${message.pending} change(s) queued`, 'warning');
+                break;
+            case 'replayed':
+                if (message.rejected && message.rejected.length) {
+                    this.showRejected(message.rejected);
+                } else if (message.replayed > 0) {
+                    this.showStatus(`Synced ${message.replayed} queued change(s)`, 'success', 4000);
+                } else {
+                    // Last rejected change resolved
+                    const panel = document.querySelector('.offline-rejected');
+                    if (panel) panel.parentElement.remove();
+                }
+                if (message.replayed > 0) {
+                    this.pullChanges();
+                }
+                break;
+            case 'login-required':
+                this.showStatus(`Session expired - log in to sync ${message.pending} queued change(s)`, 'danger');
+                break;
+        }
+    },
+
+    async pullChanges() {
+        const stored = localStorage.getItem(this.cursorKey);
+        let cursor = stored === null ? null : parseInt(stored, 10);
+        const changedTables = new Set();
+        let reset = false;
+
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const query = cursor === null ? '' : `?cursor=${cursor}`;
+                const response = await fetch(`/api/sync/changes${query}`, { credentials: 'same-origin' });
+                if (!response.ok || response.redirected) return;
+                const data = await response.json();
+
+                Object.keys(data.changes).forEach(table => changedTables.add(table));
+                reset = reset || (data.reset && stored !== null);
+                cursor = data.cursor;
+                hasMore = data.has_more;
+            }
+        } catch (error) {
+            return; // Offline or server unreachable, try again later
+        }
+
+        localStorage.setItem(this.cursorKey, String(cursor));
+        if (stored === null || changedTables.size === 0) return;
+
+        // Drop stale cached copies of affected pages so offline views stay current
+        const stalePaths = Object.keys(this.pageTables)
+            .filter(path => reset || this.pageTables[path].some(table => changedTables.has(table)));
+        const registration = await navigator.serviceWorker.ready;
+        if (registration.active) {
+            registration.active.postMessage({ type: 'invalidate', paths: stalePaths });
+        }
+
+        if (stalePaths.includes(window.location.pathname)) {
+            this.showStatus('This page has new changes', 'info', 0, true);
+        }
+    },
+
+    // Signed-in pages must not stay readable after logout; queued changes are kept for the next login
+    async clearCachedPages() {
+        localStorage.removeItem(this.cursorKey);
+        const names = await caches.keys();
+        await Promise.all(names.filter(name => name.startsWith('acep-pages-')).map(name => caches.delete(name)));
+    },
+
+    // Queued changes the server refused, with what changed underneath them for conflicts
+    showRejected(rejected) {
+        this.showStatus(`${rejected.length} queued change(s) were not saved`, 'danger');
+        const status = document.querySelector('.offline-status');
+        const list = document.createElement('ul');
+        list.className = 'offline-rejected';
+
+        rejected.forEach(item => {
+            const entry = document.createElement('li');
+            const summary = document.createElement('div');
+            summary.textContent = `${new URL(item.url).pathname}: ${item.status === 409 ? 'changed by someone else' : item.error}`;
+            entry.appendChild(summary);
+
+            if (item.status === 409 && item.current && item.submitted) {
+                Object.entries(item.submitted)
+                    .filter(([field, value]) => field !== 'row_version' && field in item.current && String(item.current[field] ?? '') !== value)
+                    .forEach(([field, value]) => {
+                        const diff = document.createElement('div');
+                        diff.className = 'offline-rejected-diff';
+                        diff.textContent = `${field}: yours "${value}", current "${item.current[field] ?? ''}"`;
+                        entry.appendChild(diff);
+                    });
+            }
+
+            const actions = item.status === 409 && item.submitted ? [['overwrite', 'Keep mine'], ['discard', 'Discard']] : [['discard', 'Discard']];
+            actions.forEach(([action, label]) => {
+                const button = document.createElement('button');
+                button.className = 'btn btn-sm btn-link';
+                button.textContent = label;
+                button.addEventListener('click', () => this.resolveRejected(item.id, action));
+                entry.appendChild(button);
+            });
+            list.appendChild(entry);
+        });
+        status.appendChild(list);
+    },
+
+    async resolveRejected(id, action) {
+        const registration = await navigator.serviceWorker.ready;
+        if (registration.active) {
+            registration.active.postMessage({ type: 'resolve', id: id, action: action });
+        }
+    },
+
+    showStatus(text, level, timeout = 0, offerRefresh = false) {
+        let status = document.querySelector('.offline-status');
+        if (!status) {
+            status = document.createElement('div');
+            status.className = 'offline-status';
+            document.body.appendChild(status);
+        }
+        status.className = `offline-status offline-status-${level}`;
+        status.textContent = text;
+        if (offerRefresh) {
+            const refresh = document.createElement('button');
+            refresh.className = 'btn btn-sm btn-link';
+            refresh.textContent = 'Refresh';
+            refresh.addEventListener('click', () => window.location.reload());
+            status.appendChild(refresh);
+        }
+
+        clearTimeout(this.statusTimer);
+        if (timeout) {
+            this.statusTimer = setTimeout(() => status.remove(), timeout);
+        }
+    }
+};
+
+document.addEventListener('DOMContentLoaded', () => OfflineSync.init());
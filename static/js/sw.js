@@ -0,0 +1,283 @@
+/**
+ * ACEP PCI DSS AUDIT ASSISTANT - Offline Service Worker
+ * Caches pages for offline viewing and queues form submissions made without
+ * connectivity so they can be replayed once the assessor is back online.
+ */
+
+const CACHE_NAME = 'acep-pages-v1';
+const DB_NAME = 'acep-offline';
+const OUTBOX = 'outbox';
+const SYNC_TAG = 'acep-outbox';
+
+// Never cache or queue these: session handling, downloads and live data
+const BYPASS_PATHS = ['/login', '/logout', '/api/', '/dashboard/stream', '/evidence/download/', '/evidence/export', '/sw.js'];
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names.filter(name => name !== CACHE_NAME).map(name => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        // CDN assets (Bootstrap, icons) are versioned, serve them from cache when we have them
+        if (request.method === 'GET') {
+            event.respondWith(cacheFirst(request));
+        }
+        return;
+    }
+
+    if (url.pathname === '/logout') {
+        // Cached pages must not outlive the session
+        event.waitUntil(clearCachedPages());
+        return;
+    }
+
+    // Event streams never end, so they can't be cached
+    if (BYPASS_PATHS.some(path => url.pathname.startsWith(path))
+            || (request.headers.get('Accept') || '').includes('text/event-stream')) {
+        return;
+    }
+
+    if (request.method === 'POST') {
+        event.respondWith(sendOrQueue(request));
+    } else if (request.method === 'GET') {
+        event.respondWith(url.pathname.startsWith('/static/') ? cacheFirst(request) : networkFirst(request));
+    }
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === SYNC_TAG) {
+        event.waitUntil(replayOutbox());
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'replay') {
+        event.waitUntil(replayOutbox());
+    } else if (event.data && event.data.type === 'resolve') {
+        event.waitUntil(resolveRejected(event.data.id, event.data.action));
+    } else if (event.data && event.data.type === 'invalidate') {
+        event.waitUntil(invalidatePages(event.data.paths || []));
+    }
+});
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok || response.type === 'opaque') {
+        const cache = await caches.open(CACHE_NAME);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        // Only keep real pages, not redirects to the login screen
+        if (response.ok && !response.redirected) {
+            const cache = await caches.open(CACHE_NAME);
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request, { ignoreSearch: true });
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function invalidatePages(paths) {
+    const cache = await caches.open(CACHE_NAME);
+    await Promise.all(paths.map(path => cache.delete(new URL(path, self.location.origin).href, { ignoreSearch: true })));
+}
+
+// The outbox is kept: queued and rejected changes are sent or resolved after the next login
+async function clearCachedPages() {
+    const names = await caches.keys();
+    await Promise.all(names.filter(name => name.startsWith('acep-pages-')).map(name => caches.delete(name)));
+}
+
+// Form submissions
+async function sendOrQueue(request) {
+    const copy = request.clone();
+    try {
+        return await fetch(request);
+    } catch (error) {
+        await outboxAdd({
+            url: copy.url,
+            contentType: copy.headers.get('Content-Type'),
+            body: await copy.arrayBuffer(),
+            queuedAt: new Date().toISOString()
+        });
+        if (self.registration.sync) {
+            self.registration.sync.register(SYNC_TAG).catch(() => {});
+        }
+        await notifyClients({ type: 'queued', pending: await outboxCount() });
+
+        // Send the assessor back to the page they submitted from, served from cache
+        return Response.redirect(request.referrer || '/dashboard', 303);
+    }
+}
+
+// Replays are triggered by sync events and by every open tab; running two at
+// once would send the same queued POST twice, so callers share the one in flight
+let replaying = null;
+
+function replayOutbox() {
+    if (!replaying) {
+        replaying = sendOutbox().finally(() => { replaying = null; });
+    }
+    return replaying;
+}
+
+async function sendOutbox() {
+    // Rejected items wait for the assessor to resolve them and are not retried
+    const items = (await outboxAll()).filter(item => !item.rejected);
+    let replayed = 0;
+
+    for (const item of items) {
+        let response;
+        try {
+            // Ask for JSON so edit conflicts come back as 409 with the current record
+            const headers = { 'Accept': 'application/json' };
+            if (item.contentType) {
+                headers['Content-Type'] = item.contentType;
+            }
+            response = await fetch(item.url, {
+                method: 'POST',
+                headers: headers,
+                body: item.body,
+                credentials: 'same-origin'
+            });
+        } catch (error) {
+            break; // Still offline, keep the rest queued in order
+        }
+
+        if (new URL(response.url).pathname === '/login') {
+            // Session expired; keep the queue until the assessor logs back in
+            await notifyClients({ type: 'login-required', pending: await outboxCount() });
+            return;
+        }
+
+        if (response.status >= 500) {
+            break; // Server trouble, retry this and everything after it later
+        }
+
+        if (!response.ok) {
+            // Conflict or invalid data: keep the change for review instead of dropping it
+            const detail = await response.json().catch(() => ({}));
+            item.rejected = {
+                status: response.status,
+                error: detail.error || response.statusText,
+                current: detail.current || null
+            };
+            await outboxPut(item);
+            continue;
+        }
+
+        await outboxDelete(item.id);
+        replayed++;
+    }
+
+    await notifyClients({
+        type: 'replayed',
+        replayed: replayed,
+        pending: await outboxCount(),
+        rejected: await rejectedSummaries()
+    });
+}
+
+async function rejectedSummaries() {
+    const items = (await outboxAll()).filter(item => item.rejected);
+    return items.map(item => ({
+        id: item.id,
+        url: item.url,
+        queuedAt: item.queuedAt,
+        status: item.rejected.status,
+        error: item.rejected.error,
+        current: item.rejected.current,
+        submitted: formFields(item)
+    }));
+}
+
+function formFields(item) {
+    if (!item.contentType || !item.contentType.startsWith('application/x-www-form-urlencoded')) {
+        return null;
+    }
+    return Object.fromEntries(new URLSearchParams(new TextDecoder().decode(item.body)));
+}
+
+// 'discard' drops a rejected change; 'overwrite' resubmits it against the current record version
+async function resolveRejected(id, action) {
+    const item = (await outboxAll()).find(entry => entry.id === id && entry.rejected);
+    if (!item) {
+        return;
+    }
+
+    if (action === 'overwrite' && item.rejected.status === 409 && item.rejected.current && formFields(item)) {
+        const fields = new URLSearchParams(new TextDecoder().decode(item.body));
+        fields.set('row_version', item.rejected.current.row_version);
+        item.body = new TextEncoder().encode(fields.toString()).buffer;
+        delete item.rejected;
+        await outboxPut(item);
+        await replaying; // A replay already running read the outbox before this item was requeued
+        return replayOutbox();
+    }
+
+    await outboxDelete(id);
+    await notifyClients({ type: 'replayed', replayed: 0, pending: await outboxCount(), rejected: await rejectedSummaries() });
+}
+
+async function notifyClients(message) {
+    const clients = await self.clients.matchAll({ type: 'window' });
+    clients.forEach(client => client.postMessage(message));
+}
+
+// Minimal IndexedDB outbox
+function openDb() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(DB_NAME, 2);
+        open.onupgradeneeded = () => {
+            const db = open.result;
+            if (!db.objectStoreNames.contains(OUTBOX)) {
+                db.createObjectStore(OUTBOX, { keyPath: 'id', autoIncrement: true });
+            }
+            // Version 1 also kept a replica of synced rows that nothing read
+            if (db.objectStoreNames.contains('records')) {
+                db.deleteObjectStore('records');
+            }
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function outboxRequest(mode, operation) {
+    const db = await openDb();
+    return new Promise((resolve, reject) => {
+        const request = operation(db.transaction(OUTBOX, mode).objectStore(OUTBOX));
+        db.close(); // Takes effect once the transaction finishes
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+const outboxAdd = item => outboxRequest('readwrite', store => store.add(item));
+const outboxPut = item => outboxRequest('readwrite', store => store.put(item));
+const outboxAll = () => outboxRequest('readonly', store => store.getAll());
+const outboxCount = () => outboxRequest('readonly', store => store.count());
+const outboxDelete = id => outboxRequest('readwrite', store => store.delete(id));